@@ -0,0 +1,52 @@
+import os
+import asyncio
+
+# ASGI app used by bench_sessions.py: the real `main:app` with every external call
+# (Groq, Supabase, summarization) replaced by a fixed-latency fake, so a benchmark
+# measures only this process's own work: WebSocket framing, JSON, prompt building.
+#
+# Dummy credentials are forced before `main` is imported, so the benchmark can never
+# reach a real Supabase project or spend Groq quota even if a .env file is present.
+os.environ["SUPABASE_URL"] = "http://127.0.0.1:9"
+os.environ["SUPABASE_KEY"] = "bench.bench.bench"
+os.environ["GROQ_API_KEY"] = "bench"
+os.environ["SEMANTIC_CACHE_ENABLED"] = "false"
+os.environ.setdefault("TRACE_EXPORT_PATH", "")
+
+import main
+import sessions
+from main import app  # noqa: F401  (served by uvicorn as bench_app:app)
+
+LLM_LATENCY = float(os.environ.get("BENCH_LLM_LATENCY_MS", "50")) / 1000
+DB_LATENCY = float(os.environ.get("BENCH_DB_LATENCY_MS", "5")) / 1000
+RESPONSE_CHARS = int(os.environ.get("BENCH_RESPONSE_CHARS", "400"))
+FAKE_RESPONSE = ("The capital of India is New Delhi. " * (RESPONSE_CHARS // 35 + 1))[:RESPONSE_CHARS]
+
+
+async def fake_generate_response(prompt: str, system_prompt: str = "You are a helpful assistant."):
+    await asyncio.sleep(LLM_LATENCY)
+    return FAKE_RESPONSE
+
+
+async def fake_db_write(*args, **kwargs):
+    await asyncio.sleep(DB_LATENCY)
+
+
+async def fake_get_recent_events(session_id: str, limit: int = 10):
+    await asyncio.sleep(DB_LATENCY)
+    return []
+
+
+async def fake_noop(*args, **kwargs):
+    return None
+
+
+main.generate_response = fake_generate_response
+main.log_event = fake_db_write
+main.upsert_session = fake_db_write
+main.get_recent_events = fake_get_recent_events
+main.run_summarization = fake_noop
+main.warm_up_if_idle = lambda: None
+sessions.end_sessions = fake_db_write
+# The artificial per-chunk "typing" delay would cap throughput regardless of core count
+main.STREAM_CHUNK_DELAY = 0
@@ -0,0 +1,114 @@
+import time
+import argparse
+import logging
+import streamlit as st
+from stream_render import ThrottledRenderer
+
+# Compares the Streamlit client's CPU cost per connected user: the previous
+# rendering strategy (1-second full-page autorefresh, history re-formatted on
+# every rerun, full text re-rendered on every 4-character chunk) against the
+# current one (reruns only on new data, bubble markup built once per message,
+# frame-rate throttled streaming). Both still re-emit the whole history on
+# every rerun; the new client simply reruns far less often.
+#
+# Streamlit calls run in "bare" mode (no server), which still builds and
+# serializes every element, so the measured CPU is the client's render work.
+#
+# Usage:
+#   python bench_client_render.py --minutes 1 --answers 4 --answer-chars 2000
+
+CHUNK_SIZE = 4          # characters per backend frame (see main.py)
+CHUNK_INTERVAL = 0.01   # seconds between backend frames
+MARKER = '<div class="chat-ai-marker" style="display:none;"></div>'
+
+
+def render_history(messages, prebuilt: bool):
+    for m in messages:
+        with st.chat_message(m["role"]):
+            if prebuilt:
+                st.markdown(m["html"], unsafe_allow_html=True)
+            else:
+                marker_class = "chat-user-marker" if m["role"] == "user" else "chat-ai-marker"
+                st.markdown(f'<div class="{marker_class}" style="display:none;"></div>{m["content"]}', unsafe_allow_html=True)
+
+
+def stream_old(answer: str):
+    placeholder = st.empty()
+    full = ""
+    for i in range(0, len(answer), CHUNK_SIZE):
+        full += answer[i:i + CHUNK_SIZE]
+        placeholder.markdown(MARKER + full + "▌", unsafe_allow_html=True)
+    placeholder.markdown(MARKER + full, unsafe_allow_html=True)
+
+
+def stream_new(answer: str, fps: float) -> int:
+    placeholder = st.empty()
+    # Simulated clock: frames arrive every CHUNK_INTERVAL seconds
+    clock = {"now": 0.0}
+    renderer = ThrottledRenderer(
+        lambda text, done: placeholder.markdown(MARKER + text + ("" if done else "▌"), unsafe_allow_html=True),
+        fps=fps,
+        clock=lambda: clock["now"],
+    )
+    for i in range(0, len(answer), CHUNK_SIZE):
+        clock["now"] += CHUNK_INTERVAL
+        renderer.push(answer[i:i + CHUNK_SIZE])
+    renderer.finish()
+    return renderer.render_count
+
+
+def make_message(role: str, content: str) -> dict:
+    marker_class = "chat-user-marker" if role == "user" else "chat-ai-marker"
+    return {"role": role, "content": content, "html": f'<div class="{marker_class}" style="display:none;"></div>{content}'}
+
+
+def run(strategy: str, args) -> tuple:
+    """Simulates `args.minutes` of one user's session; returns (cpu_seconds, render_calls)."""
+    answer = ("lorem ipsum dolor sit amet " * (args.answer_chars // 27 + 1))[:args.answer_chars]
+    messages = []
+    renders = 0
+    start = time.process_time()
+    for _ in range(args.answers):
+        messages.append(make_message("user", "Tell me something interesting."))
+        if strategy == "old":
+            stream_old(answer)
+            renders += len(answer) // CHUNK_SIZE + 1
+        else:
+            renders += stream_new(answer, args.fps)
+        messages.append(make_message("assistant", answer))
+        # New client: one rerun after sending, one after the answer completes
+        if strategy == "new":
+            for _ in range(2):
+                render_history(messages, prebuilt=True)
+                renders += len(messages)
+    if strategy == "old":
+        # Autorefresh heartbeat: a full rerun every second for the whole session
+        for _ in range(int(args.minutes * 60)):
+            render_history(messages, prebuilt=False)
+            renders += len(messages)
+    return time.process_time() - start, renders
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Streamlit client render CPU per connected user.")
+    parser.add_argument("--minutes", type=float, default=1.0, help="Simulated session length")
+    parser.add_argument("--answers", type=int, default=4, help="Answers streamed during the session")
+    parser.add_argument("--answer-chars", type=int, default=2000)
+    parser.add_argument("--fps", type=float, default=15)
+    args = parser.parse_args()
+
+    # Bare-mode Streamlit warns about the missing ScriptRunContext on every call
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+    print(f"{'client':>7} {'cpu ms/user':>12} {'render calls':>13}")
+    results = {}
+    for strategy in ("old", "new"):
+        cpu, renders = run(strategy, args)
+        results[strategy] = cpu
+        print(f"{strategy:>7} {cpu * 1000:>12.1f} {renders:>13}")
+    if results["new"]:
+        print(f"CPU reduction: {results['old'] / results['new']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
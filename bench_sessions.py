@@ -0,0 +1,124 @@
+import os
+import sys
+import time
+import uuid
+import asyncio
+import argparse
+import subprocess
+import multiprocessing
+import httpx
+import websockets
+from stream_render import END_OF_MESSAGE
+
+# Benchmarks session throughput (sessions/sec) of the backend as the number of
+# uvicorn workers grows. Each "session" is: connect, send one message, read the
+# whole streamed answer up to END_OF_MESSAGE, disconnect.
+#
+# The server is started locally through serve.py for every worker count, serving
+# `bench_app:app`: the real app with Groq, Supabase and summarization replaced by
+# fixed-latency fakes (see bench_app.py). External API latency and rate limits
+# would otherwise cap throughput regardless of core count, and no real project or
+# quota is touched. Fake latencies are set with BENCH_LLM_LATENCY_MS,
+# BENCH_DB_LATENCY_MS and BENCH_RESPONSE_CHARS.
+#
+# Usage:
+#   python bench_sessions.py --workers 1,2,4,8 --sessions 2000 --concurrency 256
+#
+# Note: the load generator runs on the same machine, so keep --clients well
+# below the core count or the client becomes the bottleneck.
+
+
+async def run_session(url: str, message: str, timeout: float) -> bool:
+    """True only if the session received real content followed by END_OF_MESSAGE."""
+    try:
+        async with websockets.connect(url.format(session_id=uuid.uuid4())) as ws:
+            await ws.send(message)
+            parts = []
+            while True:
+                frame = await asyncio.wait_for(ws.recv(), timeout=timeout)
+                if frame == END_OF_MESSAGE:
+                    break
+                parts.append(frame)
+        text = "".join(parts)
+        # generate_response reports failures as ordinary text
+        return bool(text) and not text.startswith("Error generating response")
+    except Exception:
+        return False
+
+
+async def run_load(url: str, sessions: int, concurrency: int, message: str, timeout: float) -> int:
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with sem:
+            return await run_session(url, message, timeout)
+
+    results = await asyncio.gather(*(one() for _ in range(sessions)))
+    return sum(results)
+
+
+def client_process(args) -> int:
+    """Entry point for one load-generator process."""
+    url, sessions, concurrency, message, timeout = args
+    return asyncio.run(run_load(url, sessions, concurrency, message, timeout))
+
+
+def wait_until_ready(port: int, timeout: float = 60.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/metrics/latency", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError(f"Server on port {port} did not become ready within {timeout}s")
+
+
+def bench(workers: int, args) -> tuple:
+    server = subprocess.Popen(
+        [sys.executable, "serve.py", "--app", "bench_app:app", "--workers", str(workers),
+         "--host", "127.0.0.1", "--port", str(args.port)],
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        wait_until_ready(args.port)
+        # Give every worker time to finish its startup before measuring
+        time.sleep(1.0)
+        url = f"ws://127.0.0.1:{args.port}/ws/session/{{session_id}}"
+        per_client = args.sessions // args.clients
+        jobs = [(url, per_client, max(1, args.concurrency // args.clients), args.message, args.timeout)] * args.clients
+
+        start = time.perf_counter()
+        with multiprocessing.Pool(args.clients) as pool:
+            ok = sum(pool.map(client_process, jobs))
+        elapsed = time.perf_counter() - start
+        return ok, per_client * args.clients, elapsed
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure sessions/sec scaling with uvicorn worker count.")
+    parser.add_argument("--workers", default=f"1,{os.cpu_count() or 1}", help="Comma-separated worker counts to test")
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=256)
+    parser.add_argument("--clients", type=int, default=2, help="Load-generator processes")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--message", default="What is the capital of India?")
+    args = parser.parse_args()
+
+    print(f"{'workers':>8} {'ok':>6} {'total':>6} {'seconds':>9} {'sessions/s':>11} {'speedup':>8}")
+    baseline = None
+    for workers in [int(w) for w in args.workers.split(",")]:
+        ok, total, elapsed = bench(workers, args)
+        rate = ok / elapsed if elapsed else 0.0
+        baseline = baseline or rate
+        speedup = rate / baseline if baseline else 0.0
+        print(f"{workers:>8} {ok:>6} {total:>6} {elapsed:>9.2f} {rate:>11.1f} {speedup:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -37,13 +37,6 @@ async def log_event(session_id: str, event_type: str, payload: dict):
     # Fire and forget
     supabase.table("events").insert(data).execute()
 
-async def end_session(session_id: str):
-    """Updates the session with end_time."""
-    data = {
-        "end_time": datetime.now(timezone.utc).isoformat()
-    }
-    supabase.table("sessions").update(data).eq("session_id", session_id).execute()
-
 async def update_session_summary(session_id: str, summary: str):
     """Updates the session with the generated summary."""
     supabase.table("sessions").update({"summary": summary}).eq("session_id", session_id).execute()
@@ -52,3 +45,31 @@ async def get_session_events(session_id: str):
     """Fetches all events for a session, ordered by time."""
     response = supabase.table("events").select("*").eq("session_id", session_id).order("timestamp").execute()
     return response.data
+
+async def upsert_session(session_id: str, user_id: str = "anonymous_user"):
+    """
+    Creates or resumes a session. Runs in a worker thread so it can overlap other startup work.
+    Resuming clears end_time, which another worker may have written when it dropped an earlier
+    connection of the same session.
+    """
+    data = {
+        "session_id": session_id,
+        "user_id": user_id,
+        "start_time": "now()",
+        "end_time": None
+    }
+    await asyncio.to_thread(lambda: supabase.table("sessions").upsert(data).execute())
+
+async def get_recent_events(session_id: str, limit: int = 10):
+    """Fetches the most recent `limit` events for a session, oldest first."""
+    query = supabase.table("events").select("*").eq("session_id", session_id).order("timestamp", desc=True).limit(limit)
+    response = await asyncio.to_thread(query.execute)
+    return list(reversed(response.data))
+
+async def end_sessions(session_ids: list):
+    """Sets end_time on many sessions with a single batched update."""
+    data = {
+        "end_time": datetime.now(timezone.utc).isoformat()
+    }
+    query = supabase.table("sessions").update(data).in_("session_id", session_ids)
+    await asyncio.to_thread(query.execute)
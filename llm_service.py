@@ -1,6 +1,9 @@
 import os
+import time
+import asyncio
 from groq import AsyncGroq
 from dotenv import load_dotenv
+from observability import get_logger, span
 
 # Load environment variables from .env file
 load_dotenv()
@@ -13,24 +16,39 @@ if not api_key:
 # Initialize asynchronous Groq client
 client = AsyncGroq(api_key=api_key)
 
+logger = get_logger("llm_service")
+
 # Define the model to use (Llama 3.1 8B Instant is fast and cost-effective)
 MODEL = "llama-3.1-8b-instant"
 
+# httpx closes pooled connections idle for longer than this (its default keepalive_expiry)
+KEEPALIVE_EXPIRY = 5.0
+
+# Warm-up requests give up quickly and never retry: they are only an optimization, and a slow or
+# unreachable API must not hold anything up for the SDK's default timeout and retry budget
+WARM_UP_TIMEOUT = 2.0
+
+# Monotonic time of the last request to Groq, and the in-flight warm-up (kept referenced)
+_last_request = float("-inf")
+_warm_up_task = None
+
 async def generate_response(prompt: str, system_prompt: str = "You are a helpful assistant."):
     """Generates a response from the LLM using Groq API."""
     try:
-        completion = await client.chat.completions.create(
-            model=MODEL,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.7,
-            max_tokens=512,
-        )
+        with span("llm_call", model=MODEL, prompt_chars=len(prompt)):
+            completion = await client.chat.completions.create(
+                model=MODEL,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": prompt},
+                ],
+                temperature=0.7,
+                max_tokens=512,
+            )
+        _mark_used()
         return completion.choices[0].message.content
     except Exception as e:
-        print(f"Groq API Error: {e}")
+        logger.error(f"Groq API Error: {e}")
         return f"Error generating response: {e}"
 
 async def generate_summary(text_content: str):
@@ -47,3 +65,33 @@ async def generate_summary(text_content: str):
     prompt = f"Summarize the following conversation strictly and concisely:\n\n{text_content}"
     # Reuse the core generation logic with a specialized system prompt
     return await generate_response(prompt, system_prompt="You are an expert summarizer.")
+
+def _mark_used():
+    global _last_request
+    _last_request = time.monotonic()
+
+async def warm_up():
+    """
+    Opens the HTTPS connection to the Groq API ahead of the first real request,
+    so TLS/connection setup is not paid on the first turn's critical path.
+    The request shares `client`'s connection pool but uses WARM_UP_TIMEOUT and no retries.
+    """
+    _mark_used()
+    try:
+        await client.with_options(timeout=WARM_UP_TIMEOUT, max_retries=0).models.list()
+        _mark_used()
+    except Exception as e:
+        logger.warning(f"Groq warm-up failed: {e}")
+
+def warm_up_if_idle():
+    """
+    Starts a background warm-up only when the pooled connection has probably expired
+    (no Groq request for KEEPALIVE_EXPIRY seconds) and none is already running.
+    Under steady traffic this never calls the API; when idle it costs at most one call.
+    """
+    global _warm_up_task
+    if time.monotonic() - _last_request < KEEPALIVE_EXPIRY:
+        return
+    if _warm_up_task is not None and not _warm_up_task.done():
+        return
+    _warm_up_task = asyncio.create_task(warm_up())
@@ -0,0 +1,146 @@
+import os
+import sys
+import time
+import asyncio
+import threading
+import traceback
+from collections import Counter
+from metrics import RollingStats
+from observability import get_logger
+
+logger = get_logger("loop_monitor")
+
+# Configuration (all optional, read from the environment)
+INTERVAL = float(os.environ.get("LOOP_MONITOR_INTERVAL", "0.5"))
+BLOCK_THRESHOLD_MS = float(os.environ.get("LOOP_BLOCK_THRESHOLD_MS", "100"))
+# Debug mode starts a watchdog thread that captures the stack of whatever is blocking the loop
+DEBUG = os.environ.get("LOOP_MONITOR_DEBUG", "false").lower() in ("1", "true", "yes")
+
+# Frames from files in this directory are "ours"; used to name the offending function
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class LoopMonitor:
+    """
+    Measures event-loop scheduling delay and, optionally, detects blocking calls.
+
+    Lag sampling: a task sleeps for `interval` seconds and records how late it woke up.
+    That costs one timer callback per interval, so it is always on.
+
+    Blocking detection (debug mode): a heartbeat callback re-arms itself every quarter of
+    `block_threshold_ms`, so any stall of the loop longer than the threshold delays it. A watchdog
+    thread polling at the same rate grabs the loop thread's stack once the heartbeat is half a
+    threshold overdue, i.e. while the stall is still in progress. When the loop resumes, the
+    heartbeat measures the exact stall from the previous beat and, if it exceeded the threshold,
+    reports it with the innermost application function on the captured stack
+    (e.g. `log_event` while a sync Supabase call is in flight).
+    """
+
+    def __init__(self, interval: float = INTERVAL, block_threshold_ms: float = BLOCK_THRESHOLD_MS, debug: bool = DEBUG):
+        self.interval = interval
+        self.block_threshold = block_threshold_ms / 1000
+        self.debug = debug
+        self.lag = RollingStats()
+        self.blocked_count = 0
+        self.offenders = Counter()
+        self._beat_period = self.block_threshold / 4
+        self._heartbeat = time.monotonic()
+        self._beat_handle = None
+        # (heartbeat it belongs to, offender, formatted stack) captured by the watchdog mid-stall
+        self._capture = None
+        self._task = None
+        self._watchdog = None
+        self._stop = threading.Event()
+        self._loop_thread_id = None
+
+    async def _sample(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - expected)
+            self.lag.observe(lag)
+            if lag >= self.block_threshold and not self.debug:
+                logger.warning("event loop lag", extra={"lag_ms": round(lag * 1000, 3)})
+
+    def _beat(self):
+        """Debug-mode heartbeat; runs on the loop thread every `_beat_period` seconds."""
+        now = time.monotonic()
+        previous, self._heartbeat = self._heartbeat, now
+        stalled_for = now - previous - self._beat_period
+        if stalled_for >= self.block_threshold:
+            capture = self._capture
+            if capture is not None and capture[0] == previous:
+                _, offender, stack = capture
+            else:
+                offender, stack = "unknown", ""
+            self.blocked_count += 1
+            self.offenders[offender] += 1
+            logger.warning(
+                f"Event loop blocked for {stalled_for * 1000:.0f}ms in {offender}",
+                extra={"blocked_ms": round(stalled_for * 1000, 3), "offender": offender, "stack": stack},
+            )
+        self._beat_handle = asyncio.get_running_loop().call_later(self._beat_period, self._beat)
+
+    def _watch(self):
+        while not self._stop.wait(self._beat_period):
+            heartbeat = self._heartbeat
+            if time.monotonic() - heartbeat < self.block_threshold / 2:
+                continue
+            if self._capture is not None and self._capture[0] == heartbeat:
+                continue  # this stall's stack is already captured
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame)
+            self._capture = (heartbeat, _innermost_app_frame(stack), "".join(traceback.format_list(stack[-15:])))
+
+    def start(self):
+        """Starts monitoring the running event loop. Call from within the loop (e.g. app lifespan)."""
+        loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._task = loop.create_task(self._sample())
+        if self.debug:
+            self._heartbeat = time.monotonic()
+            self._beat_handle = loop.call_later(self._beat_period, self._beat)
+            self._stop.clear()
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+
+    async def stop(self):
+        if self._watchdog is not None:
+            self._stop.set()
+            self._watchdog.join()
+            self._watchdog = None
+        if self._beat_handle is not None:
+            self._beat_handle.cancel()
+            self._beat_handle = None
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "interval_s": self.interval,
+            "lag_s": self.lag.snapshot(),
+            "debug": self.debug,
+            "blocked_count": self.blocked_count,
+            "top_offenders": dict(self.offenders.most_common(10)),
+        }
+
+
+def _innermost_app_frame(stack) -> str:
+    """Names the innermost frame that belongs to this application (not a library or the monitor)."""
+    for fs in reversed(stack):
+        path = os.path.abspath(fs.filename)
+        if path.startswith(_APP_DIR) and path != os.path.abspath(__file__) and "site-packages" not in path:
+            return f"{fs.name} ({os.path.basename(path)}:{fs.lineno})"
+    last = stack[-1]
+    return f"{last.name} ({os.path.basename(last.filename)}:{last.lineno})"
+
+
+# Process-wide instance, started/stopped by the app lifespan
+loop_monitor = LoopMonitor()
@@ -1,10 +1,77 @@
+import os
+import time
 import asyncio
 import json
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
-from database import create_session, log_event, end_session, update_session_summary, get_session_events, supabase
-from llm_service import generate_response, generate_summary
+from database import create_session, log_event, update_session_summary, get_session_events, get_recent_events, upsert_session, supabase
+from llm_service import generate_response, generate_summary, warm_up_if_idle
+from metrics import RollingStats
+from observability import setup_logging, shutdown_logging, get_logger, trace_turn, span, logging_stats
+from semantic_cache import semantic_cache, cached_generate, cache_stats
+from loop_monitor import loop_monitor
+from stream_render import END_OF_MESSAGE
+from sessions import session_registry
 
-app = FastAPI()
+logger = get_logger("main")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application startup/shutdown hooks."""
+    setup_logging()
+    if semantic_cache is not None:
+        # Load the embedding model off the request path, once per process
+        try:
+            await asyncio.to_thread(semantic_cache.load_model)
+        except Exception as e:
+            logger.error(f"Error loading semantic cache model: {e}")
+    # Open the Groq connection pool once per worker, in the background so a slow API never
+    # delays worker startup
+    warm_up_if_idle()
+    loop_monitor.start()
+    session_registry.start()
+    yield
+    # Writes end_time for sessions that ended since the last reaper pass
+    await session_registry.stop()
+    await loop_monitor.stop()
+    # Persist the semantic cache so warm entries survive restarts
+    if semantic_cache is not None:
+        try:
+            semantic_cache.save()
+        except Exception as e:
+            logger.error(f"Error saving semantic cache: {e}")
+    shutdown_logging()
+
+app = FastAPI(lifespan=lifespan)
+
+# Number of previous events sent to the LLM as conversation context
+CONTEXT_WINDOW = 10
+
+# Pause between streamed chunks (seconds), purely for visual effect
+STREAM_CHUNK_DELAY = 0.01
+
+# Start the history fetch and LLM warm-up at WebSocket accept time instead of on the first message.
+# Set PREFETCH_ON_ACCEPT=false to measure the old behaviour for comparison.
+PREFETCH_ON_ACCEPT = os.environ.get("PREFETCH_ON_ACCEPT", "true").lower() in ("1", "true", "yes")
+
+# Per-connection cache of recent events, keyed by SessionEntry.key (not session_id, so a
+# reconnect overlapping a half-open old socket never shares or clobbers its state)
+session_context: dict = {}
+
+# Seconds from WebSocket accept to the first streamed chunk of the first answer. Includes the
+# time the user took to type the first message, so it mostly measures the user for real clients.
+accept_to_first_token = RollingStats()
+# Seconds from receiving the first message to its first streamed chunk: the server-side part of
+# the first turn, which is what prefetching at accept time is meant to shorten
+first_message_to_first_token = RollingStats()
+
+# Personas whose answers are deterministic enough to be reused for paraphrased questions.
+# The creative persona is excluded because users expect a fresh story/poem every time. The code
+# persona is excluded because near-identical requests ("add" vs "multiply two numbers") need
+# different answers and can still score above the similarity threshold.
+CACHEABLE_PERSONAS = {
+    "You are a helpful AI assistant.",
+}
 
 def determine_system_prompt(user_message: str) -> str:
     """
@@ -26,7 +93,7 @@ async def run_summarization(session_id: str):
     Background task to generate and save a summary of the completed session.
     Fetches the full event history, constructs a transcript, and updates the database.
     """
-    print(f"Starting background summary for session {session_id}...")
+    logger.info(f"Starting background summary for session {session_id}...")
     try:
         events = await get_session_events(session_id)
         
@@ -43,14 +110,50 @@ async def run_summarization(session_id: str):
                 transcript += f"AI: {content}\n"
         
         if not transcript.strip():
-            print(f"No transcript to summarize for {session_id}")
+            logger.info(f"No transcript to summarize for {session_id}")
             return
 
         summary = await generate_summary(transcript)
         await update_session_summary(session_id, summary)
-        print(f"Summary completed for {session_id}")
+        logger.info(f"Summary completed for {session_id}")
     except Exception as e:
-        print(f"Error in background summary for {session_id}: {e}")
+        logger.error(f"Error in background summary for {session_id}: {e}")
+
+def worker_metrics(stats: dict) -> dict:
+    """
+    Tags a metrics payload with this worker's pid. Under `serve.py --workers N` each request is
+    answered by whichever worker accepted it, so every /metrics/* response covers one worker only.
+    """
+    return {"pid": os.getpid(), **stats}
+
+@app.get("/metrics/semantic-cache")
+async def semantic_cache_metrics():
+    """Reports semantic cache hit rate and the estimated LLM latency it saved."""
+    return worker_metrics(cache_stats())
+
+@app.get("/metrics/latency")
+async def latency_metrics():
+    """Reports first-answer latency for recent connections, from accept and from the first message."""
+    return worker_metrics({
+        "prefetch_on_accept": PREFETCH_ON_ACCEPT,
+        "accept_to_first_token_s": accept_to_first_token.snapshot(),
+        "first_message_to_first_token_s": first_message_to_first_token.snapshot(),
+    })
+
+@app.get("/metrics/event-loop")
+async def event_loop_metrics():
+    """Reports event-loop scheduling lag and, in debug mode, the functions caught blocking it."""
+    return worker_metrics(loop_monitor.stats())
+
+@app.get("/metrics/logging")
+async def logging_metrics():
+    """Reports log records and spans dropped because the logging pipeline fell behind."""
+    return worker_metrics(logging_stats())
+
+@app.get("/metrics/sessions")
+async def session_metrics():
+    """Reports live/reaped/rejected session counts and approximate memory per session."""
+    return worker_metrics(session_registry.stats())
 
 @app.websocket("/ws/session/{session_id}")
 async def websocket_endpoint(websocket: WebSocket, session_id: str):
@@ -64,79 +167,158 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
     4. Maintain conversation context for the LLM.
     5. Stream LLM responses back to the client.
     """
-    await websocket.accept()
-    
+    # Per-node cap on concurrent sessions (split across workers). The handshake is completed before
+    # closing: a close before accept becomes an HTTP 403, and the client would never see 1013.
+    if not session_registry.has_capacity():
+        logger.warning(f"Session limit reached, rejecting {session_id}")
+        await websocket.accept()
+        await websocket.close(code=1013)  # Try Again Later
+        return
+
+    # Take the slot before awaiting the handshake, so a burst of concurrent handshakes cannot
+    # all pass the capacity check above
+    entry = session_registry.register(session_id)
+    try:
+        await websocket.accept()
+    except BaseException:
+        session_registry.release(entry, end=False)
+        raise
+    accepted_at = time.perf_counter()
+
+    # Speculatively start everything the first turn needs while the client is still typing:
+    # the recent history (context cache) and, if the pool has gone idle, a warm connection to
+    # the LLM API. The session upsert runs concurrently with both.
+    history_task = asyncio.create_task(get_recent_events(session_id, CONTEXT_WINDOW)) if PREFETCH_ON_ACCEPT else None
+    if PREFETCH_ON_ACCEPT:
+        warm_up_if_idle()
+
     # Initialize or resume the session in the database.
     # We use upsert to ensure we handle both new sessions and reconnections gracefully.
     try:
-        data = {
-            "session_id": session_id,
-            "user_id": "anonymous_user",  # Could be dynamic based on auth in the future
-            "start_time": "now()"
-        }
-        supabase.table("sessions").upsert(data).execute()
-        print(f"Session {session_id} initialized/resumed.")
+        await upsert_session(session_id)  # user_id could be dynamic based on auth in the future
+        logger.info(f"Session {session_id} initialized/resumed.")
     except Exception as e:
-        print(f"Error creating session: {e}")
+        logger.error(f"Error creating session: {e}")
+        if history_task:
+            history_task.cancel()
+        session_registry.release(entry, end=False)
         await websocket.close()
         return
 
+    first_token_pending = True
+    # Whether to summarize once this connection ends (clean disconnect or reaped)
+    summarize = False
     try:
         while True:
             data = await websocket.receive_text()
+            received_at = time.perf_counter()
+            # Busy sessions are never reaped, however long the turn takes
+            entry.touch(busy=True)
+            # Every turn gets its own trace id; it follows the message through all spans below,
+            # and the turn's spans are exported together if it was sampled, slow or failed
+            with trace_turn(session_id):
+                # 1. Persist the incoming user message
+                with span("log_event", event_type="user_message"):
+                    await log_event(session_id, "user_message", {"text": data})
             
-            # 1. Persist the incoming user message
-            await log_event(session_id, "user_message", {"text": data})
-            
-            # 2. Determine the appropriate AI persona based on the message content
-            system_prompt = determine_system_prompt(data)
+                # 2. Determine the appropriate AI persona based on the message content
+                system_prompt = determine_system_prompt(data)
             
-            # 3. Build Conversation Context (Memory)
-            # Retrieve recent history to provide context to the LLM
-            try:
-                history_events = await get_session_events(session_id)
-                # Exclude the current message (which was just logged) to prevent duplication if the DB query captures it
-                relevant_history = history_events[:-1] if history_events else [] 
-                
-                # Limit context to the last 10 interactions to manage token usage
-                recent_history = relevant_history[-10:]
-                
-                context_str = ""
-                for ev in recent_history:
-                    role = "user" if ev["type"] == "user_message" else "assistant"
-                    content = ev["payload"].get("text", "")
-                    context_str += f"{role}: {content}\n"
-                
-                if context_str:
-                    full_prompt = f"Context (Previous Conversation):\n{context_str}\nUser:\n{data}"
-                else:
+                # 3. Build Conversation Context (Memory)
+                # Recent history is loaded once per connection (prefetched at accept time) and then
+                # kept up to date in memory, so later turns never re-query the events table.
+                has_context = False
+                try:
+                    with span("context_build", cached=entry.key in session_context):
+                        if entry.key not in session_context:
+                            if history_task:
+                                # Prefetched before this turn's message was logged
+                                history_events = await history_task
+                            else:
+                                # Fetched after step 1, so exclude the message that was just logged
+                                history_events = (await get_recent_events(session_id, CONTEXT_WINDOW + 1))[:-1]
+                            session_context[entry.key] = list(history_events)
+                    
+                        # Limit context to the last 10 interactions to manage token usage
+                        recent_history = session_context[entry.key][-CONTEXT_WINDOW:]
+                    
+                        context_str = ""
+                        for ev in recent_history:
+                            role = "user" if ev["type"] == "user_message" else "assistant"
+                            content = ev["payload"].get("text", "")
+                            context_str += f"{role}: {content}\n"
+                    
+                        has_context = bool(recent_history)
+                        if context_str:
+                            full_prompt = f"Context (Previous Conversation):\n{context_str}\nUser:\n{data}"
+                        else:
+                            full_prompt = data
+                except Exception as e:
+                    logger.warning(f"Memory fetch error: {e}")
+                    session_context.setdefault(entry.key, [])
+                    # History is unknown, so the turn must not be treated as context-free
+                    has_context = True
                     full_prompt = data
-            except Exception as e:
-                print(f"Memory fetch error: {e}")
-                full_prompt = data
 
-            # 4. Generate Response using the LLM Service
-            response_text = await generate_response(full_prompt, system_prompt=system_prompt)
+                # 4. Generate Response using the LLM Service
+                # Context-free turns with a factual persona go through the semantic cache,
+                # so paraphrases of a previously answered question skip the LLM call.
+                if not has_context and system_prompt in CACHEABLE_PERSONAS:
+                    response_text = await cached_generate(generate_response, full_prompt, system_prompt)
+                else:
+                    response_text = await generate_response(full_prompt, system_prompt=system_prompt)
             
-            # 5. Stream the response back to the client
-            # Currently simulating streaming by chunking the complete response.
-            # In a production environment with a streaming-capable LLM, this should stream tokens directly.
-            chunk_size = 4
-            for i in range(0, len(response_text), chunk_size):
-                chunk = response_text[i:i+chunk_size]
-                await websocket.send_text(chunk)
-                await asyncio.sleep(0.01) # Small delay for visual effect
+                # 5. Stream the response back to the client
+                # Currently simulating streaming by chunking the complete response.
+                # In a production environment with a streaming-capable LLM, this should stream tokens directly.
+                chunk_size = 4
+                with span("stream", chars=len(response_text)):
+                    for i in range(0, len(response_text), chunk_size):
+                        chunk = response_text[i:i+chunk_size]
+                        await websocket.send_text(chunk)
+                        if first_token_pending:
+                            now = time.perf_counter()
+                            accept_to_first_token.observe(now - accepted_at)
+                            first_message_to_first_token.observe(now - received_at)
+                            first_token_pending = False
+                        await asyncio.sleep(STREAM_CHUNK_DELAY) # Small delay for visual effect
+                    # Explicit end-of-message frame so clients don't have to detect the end by silence
+                    await websocket.send_text(END_OF_MESSAGE)
             
-            # 6. Persist the AI's response
-            await log_event(session_id, "ai_response", {"text": response_text})
+                # 6. Persist the AI's response
+                with span("log_event", event_type="ai_response"):
+                    await log_event(session_id, "ai_response", {"text": response_text})
+                context = session_context[entry.key]
+                context.append({"type": "user_message", "payload": {"text": data}})
+                context.append({"type": "ai_response", "payload": {"text": response_text}})
+                del context[:-CONTEXT_WINDOW]
+            entry.touch()
             
     except WebSocketDisconnect:
-        print(f"Client disconnected {session_id}")
-        await end_session(session_id)
+        logger.info(f"Client disconnected {session_id}")
+        summarize = True
         
-        # Trigger background summarization task upon session end
-        asyncio.create_task(run_summarization(session_id))
+    except asyncio.CancelledError:
+        # Cancelled by the idle-session reaper; anything else (e.g. shutdown) propagates
+        if not entry.reaped:
+            raise
+        logger.info(f"Reaped idle session {session_id}")
+        try:
+            await websocket.close(code=1001)  # Going Away
+        except Exception:
+            pass
+        summarize = True
         
     except Exception as e:
-        print(f"Unexpected error: {e}")
+        logger.exception(f"Unexpected error: {e}")
         await websocket.close()
+
+    finally:
+        # Release per-connection state on every exit path. The session only ends (end_time
+        # queued for the next batch, summary generated) if no other connection for it is live.
+        session_context.pop(entry.key, None)
+        if history_task and not history_task.done():
+            history_task.cancel()
+        if session_registry.release(entry) and summarize:
+            # Trigger background summarization task upon session end
+            asyncio.create_task(run_summarization(session_id))
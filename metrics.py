@@ -0,0 +1,34 @@
+import math
+from collections import deque
+
+
+class RollingStats:
+    """
+    Keeps the last `maxlen` observations of a metric and summarizes them.
+    Cheap enough to update on every request; percentiles are computed on read.
+    """
+
+    def __init__(self, maxlen: int = 1000):
+        self._values = deque(maxlen=maxlen)
+        self.total_count = 0
+
+    def observe(self, value: float):
+        self._values.append(value)
+        self.total_count += 1
+
+    def snapshot(self) -> dict:
+        """Returns count, mean, p50, p95 and max over the retained window."""
+        values = sorted(self._values)
+        if not values:
+            return {"count": self.total_count}
+
+        def pct(p: float) -> float:
+            return values[min(len(values) - 1, math.ceil(p * len(values)) - 1)]
+
+        return {
+            "count": self.total_count,
+            "mean": round(sum(values) / len(values), 4),
+            "p50": round(pct(0.50), 4),
+            "p95": round(pct(0.95), 4),
+            "max": round(values[-1], 4),
+        }
@@ -0,0 +1,329 @@
+import os
+import sys
+import copy
+import json
+import time
+import uuid
+import queue
+import random
+import threading
+import logging
+import logging.handlers
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Configuration (all optional, read from the environment)
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+# Fraction of INFO/DEBUG records kept; WARNING and above are always kept
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", "1.0"))
+# Fraction of turns whose spans are exported; turns slower than TRACE_SLOW_MS are always exported
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", "0.1"))
+TRACE_SLOW_MS = float(os.environ.get("TRACE_SLOW_MS", "2000"))
+TRACE_EXPORT_PATH = os.environ.get("TRACE_EXPORT_PATH", "traces.jsonl")
+TRACE_COLLECTOR_URL = os.environ.get("TRACE_COLLECTOR_URL")
+# Records beyond these queue sizes are dropped rather than blocking or growing memory
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+TRACE_COLLECTOR_QUEUE_SIZE = int(os.environ.get("TRACE_COLLECTOR_QUEUE_SIZE", "5000"))
+TRACE_COLLECTOR_BATCH_SIZE = int(os.environ.get("TRACE_COLLECTOR_BATCH_SIZE", "200"))
+
+ROOT_LOGGER = "ai_chat"
+
+# Per-turn trace state; propagates into asyncio tasks and asyncio.to_thread calls
+_trace_id: ContextVar = ContextVar("trace_id", default=None)
+_trace_sampled: ContextVar = ContextVar("trace_sampled", default=False)
+_session_id: ContextVar = ContextVar("session_id", default=None)
+# Span records of the current turn, held back until the turn decides whether to export them
+_trace_spans: ContextVar = ContextVar("trace_spans", default=None)
+
+_listener = None
+# Handlers whose drop counters are reported by `logging_stats()`
+_queue_handler = None
+_collector_handler = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Returns a logger in the application namespace (e.g. `get_logger("main")`)."""
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+trace_logger = logging.getLogger(f"{ROOT_LOGGER}_trace")
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as single-line JSON, including trace/session context and `extra` fields."""
+
+    _reserved = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            # Distinguishes uvicorn worker processes in multi-worker mode
+            "pid": record.process,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in self._reserved and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            # Already formatted by DroppingQueueHandler.prepare on the caller's side
+            data["exc"] = record.exc_text
+        return json.dumps(data, default=str)
+
+
+class ContextFilter(logging.Filter):
+    """Stamps the current trace and session id onto every record (runs in the caller's context)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "trace_id"):
+            record.trace_id = _trace_id.get()
+        if not hasattr(record, "session_id"):
+            record.session_id = _session_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a random `rate` fraction of log records below WARNING. Span records are sampled per turn instead."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.name.startswith(trace_logger.name) or record.levelno >= logging.WARNING:
+            return True
+        return self.rate >= 1.0 or random.random() < self.rate
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler for a bounded queue: drops (and counts) records instead of blocking when full."""
+
+    _exc_formatter = logging.Formatter()
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Merges args into the message and renders any traceback into `exc_text`, so the listener
+        thread gets a self-contained record. Unlike `QueueHandler.prepare`, the traceback stays
+        separate from `msg` and is emitted as the `exc` field.
+        """
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self._exc_formatter.formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class CollectorHandler(logging.Handler):
+    """
+    POSTs span records to a trace collector as JSON arrays.
+
+    `emit` only formats the record and puts it on a bounded queue; a dedicated thread sends
+    batches of up to `batch_size` records. A slow or unreachable collector therefore never
+    delays the other sinks, and once the queue is full new records are dropped (and counted).
+    """
+
+    def __init__(self, url: str, timeout: float = 2.0, queue_size: int = TRACE_COLLECTOR_QUEUE_SIZE,
+                 batch_size: int = TRACE_COLLECTOR_BATCH_SIZE):
+        super().__init__()
+        self.url = url
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name="trace-collector", daemon=True)
+        self._thread.start()
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            self._queue.put_nowait(self.format(record))
+        except queue.Full:
+            self.dropped += 1
+        except Exception:
+            self.handleError(record)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._post(batch)
+                    return
+                batch.append(item)
+            self._post(batch)
+
+    def _post(self, batch: list):
+        try:
+            req = urllib.request.Request(
+                self.url,
+                data=("[" + ",".join(batch) + "]").encode("utf-8"),
+                headers={"Content-Type": "application/json"},
+                method="POST",
+            )
+            urllib.request.urlopen(req, timeout=self.timeout).close()
+        except Exception as e:
+            # Can't log through the pipeline we are part of
+            print(f"Trace collector POST failed ({len(batch)} spans dropped): {e}", file=sys.stderr)
+
+    def close(self):
+        """Sends whatever is queued, then stops the sender thread."""
+        try:
+            self._queue.put(None, timeout=self.timeout)
+            self._thread.join(self.timeout * 2)
+        except queue.Full:
+            pass
+        super().close()
+
+
+def setup_logging():
+    """
+    Installs the non-blocking logging pipeline: application code only enqueues records,
+    and a background QueueListener thread formats and writes them (stdout for logs,
+    TRACE_EXPORT_PATH and optionally TRACE_COLLECTOR_URL for spans).
+    Safe to call more than once.
+    """
+    global _listener, _queue_handler, _collector_handler
+    if _listener is not None:
+        return
+
+    formatter = JsonFormatter()
+    log_handler = logging.StreamHandler(sys.stdout)
+    log_handler.setFormatter(formatter)
+    log_handler.addFilter(lambda r: not r.name.startswith(trace_logger.name))
+
+    sinks = [log_handler]
+    if TRACE_EXPORT_PATH:
+        file_handler = logging.FileHandler(TRACE_EXPORT_PATH, encoding="utf-8")
+        file_handler.setFormatter(formatter)
+        file_handler.addFilter(lambda r: r.name.startswith(trace_logger.name))
+        sinks.append(file_handler)
+    if TRACE_COLLECTOR_URL:
+        _collector_handler = CollectorHandler(TRACE_COLLECTOR_URL)
+        _collector_handler.setFormatter(formatter)
+        _collector_handler.addFilter(lambda r: r.name.startswith(trace_logger.name))
+        sinks.append(_collector_handler)
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    _queue_handler = DroppingQueueHandler(log_queue)
+    _queue_handler.addFilter(SamplingFilter(LOG_SAMPLE_RATE))
+    _queue_handler.addFilter(ContextFilter())
+
+    app_logger = logging.getLogger(ROOT_LOGGER)
+    app_logger.setLevel(LOG_LEVEL)
+    app_logger.addHandler(_queue_handler)
+    app_logger.propagate = False
+
+    # Spans are sampled per turn in `trace_turn()`, not per record
+    trace_logger.setLevel(logging.INFO)
+    trace_logger.addHandler(_queue_handler)
+    trace_logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, *sinks, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging():
+    """Flushes queued records and stops the background writer."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+def logging_stats() -> dict:
+    """Records dropped because the log queue or the trace collector queue was full."""
+    return {
+        "log_queue_dropped": _queue_handler.dropped if _queue_handler is not None else 0,
+        "trace_collector_enabled": _collector_handler is not None,
+        "trace_collector_dropped": _collector_handler.dropped if _collector_handler is not None else 0,
+    }
+
+
+def _span_record(name: str, start_ts: float, duration_ms: float, status: str, attrs: dict) -> dict:
+    return {"span": name, "start_ts": round(start_ts, 6), "duration_ms": round(duration_ms, 3), "status": status, **attrs}
+
+
+def _export(record: dict):
+    trace_logger.info(record["span"], extra=record)
+
+
+@contextmanager
+def trace_turn(session_id: str = None, **attrs):
+    """
+    Traces one turn: assigns a trace id, collects the spans recorded inside it, and on exit
+    emits a root `turn` span. The export decision is made for the turn as a whole: all of its
+    spans are exported if the turn was sampled (TRACE_SAMPLE_RATE), took at least TRACE_SLOW_MS,
+    or any span failed; otherwise they are all dropped.
+    """
+    tokens = [
+        (_trace_id, _trace_id.set(uuid.uuid4().hex)),
+        (_trace_sampled, _trace_sampled.set(random.random() < TRACE_SAMPLE_RATE)),
+        (_trace_spans, _trace_spans.set([])),
+    ]
+    if session_id is not None:
+        tokens.append((_session_id, _session_id.set(session_id)))
+    start_ts, start = time.time(), time.perf_counter()
+    status = "ok"
+    try:
+        yield _trace_id.get()
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        duration_ms = (time.perf_counter() - start) * 1000
+        spans = _trace_spans.get()
+        spans.append(_span_record("turn", start_ts, duration_ms, status, attrs))
+        if _trace_sampled.get() or duration_ms >= TRACE_SLOW_MS or any(s["status"] == "error" for s in spans):
+            for record in spans:
+                _export(record)
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """
+    Times a block of work. Inside `trace_turn()` the span is buffered and exported with its turn;
+    outside a turn (e.g. background summaries) it is exported on its own if sampled, slow or failed.
+    Usage: `with span("llm_call", model=MODEL): ...`
+    """
+    start_ts, start = time.time(), time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        duration_ms = (time.perf_counter() - start) * 1000
+        record = _span_record(name, start_ts, duration_ms, status, attrs)
+        spans = _trace_spans.get()
+        if spans is not None:
+            spans.append(record)
+        elif random.random() < TRACE_SAMPLE_RATE or duration_ms >= TRACE_SLOW_MS or status == "error":
+            _export(record)
@@ -0,0 +1,225 @@
+import os
+import json
+import time
+import asyncio
+from collections import OrderedDict
+from observability import get_logger, span
+
+# Optional dependencies: the cache is silently disabled when they are missing.
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the deployment image
+    np = None
+try:
+    from fastembed import TextEmbedding
+except ImportError:  # pragma: no cover - depends on the deployment image
+    TextEmbedding = None
+
+logger = get_logger("semantic_cache")
+
+# Configuration (all optional, read from the environment)
+ENABLED = os.environ.get("SEMANTIC_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+MODEL_NAME = os.environ.get("SEMANTIC_CACHE_MODEL", "BAAI/bge-small-en-v1.5")
+THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+MAX_ENTRIES = int(os.environ.get("SEMANTIC_CACHE_MAX_ENTRIES", "2000"))
+CACHE_PATH = os.environ.get("SEMANTIC_CACHE_PATH", ".semantic_cache")
+# Single file under CACHE_PATH holding both the embedding matrix and the entries
+CACHE_FILE = "cache.npz"
+
+
+class SemanticCache:
+    """
+    In-process semantic cache for LLM responses.
+
+    Prompts are embedded with a small CPU-only local model and compared against
+    previously answered prompts by cosine similarity (NumPy brute force over a
+    normalized matrix). Entries are evicted in LRU order and can be persisted
+    to disk between restarts.
+    """
+
+    def __init__(self, model_name: str = MODEL_NAME, threshold: float = THRESHOLD,
+                 max_entries: int = MAX_ENTRIES, path: str = CACHE_PATH):
+        self.model_name = model_name
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.path = path
+        self._model = None
+        # key -> {"system_prompt", "prompt", "response"}; order tracks recency
+        self._entries: OrderedDict = OrderedDict()
+        # Rows of the index line up with `self._keys`
+        self._keys: list = []
+        self._matrix = np.zeros((0, 0), dtype=np.float32) if np is not None else None
+        self._next_key = 0
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        # Embedding + search time added to every cacheable turn, hit or miss
+        self.lookup_seconds = 0.0
+        self._avg_miss_latency = 0.0
+
+    @property
+    def ready(self) -> bool:
+        return self._model is not None
+
+    def load_model(self):
+        """Downloads/loads the embedding model. Blocking; call once at startup via asyncio.to_thread."""
+        if self._model is None:
+            self._model = TextEmbedding(model_name=self.model_name)
+
+    def _embed(self, text: str):
+        """Embeds and L2-normalizes a single prompt. CPU-bound; run off the event loop."""
+        vec = np.asarray(next(iter(self._model.embed([text]))), dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def _search(self, vec, system_prompt: str):
+        """Returns the key of the best match above the threshold, or None."""
+        if not self._keys:
+            return None
+        scores = self._matrix @ vec
+        for idx in np.argsort(scores)[::-1]:
+            if scores[idx] < self.threshold:
+                break
+            key = self._keys[idx]
+            if self._entries[key]["system_prompt"] == system_prompt:
+                return key
+        return None
+
+    def _evict(self):
+        """Drops least-recently-used entries until the cache fits in `max_entries`."""
+        while len(self._entries) > self.max_entries:
+            key, _ = self._entries.popitem(last=False)
+            idx = self._keys.index(key)
+            del self._keys[idx]
+            self._matrix = np.delete(self._matrix, idx, axis=0)
+
+    async def lookup(self, prompt: str, system_prompt: str):
+        """
+        Returns `(response, embedding)`. `response` is None on a miss; the
+        embedding is handed back so `store` does not have to recompute it.
+        """
+        start = time.perf_counter()
+        vec = await asyncio.to_thread(self._embed, prompt)
+        key = self._search(vec, system_prompt)
+        self.lookup_seconds += time.perf_counter() - start
+        if key is None:
+            self.misses += 1
+            return None, vec
+        self.hits += 1
+        self.saved_seconds += self._avg_miss_latency
+        self._entries.move_to_end(key)
+        return self._entries[key]["response"], vec
+
+    def store(self, prompt: str, system_prompt: str, response: str, vec, latency: float):
+        """Adds a freshly generated response and records how long it took."""
+        # Running mean of generation latency, used to estimate time saved on hits
+        self._avg_miss_latency += (latency - self._avg_miss_latency) / max(self.misses, 1)
+        if response.startswith("Error generating response"):
+            return
+        key = self._next_key
+        self._next_key += 1
+        self._entries[key] = {"system_prompt": system_prompt, "prompt": prompt, "response": response}
+        self._keys.append(key)
+        row = vec.reshape(1, -1)
+        self._matrix = row if self._matrix.size == 0 else np.vstack([self._matrix, row])
+        self._evict()
+
+    def stats(self) -> dict:
+        """Hit rate and estimated latency saved since startup, net of the lookup overhead."""
+        total = self.hits + self.misses
+        return {
+            "enabled": True,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "avg_miss_latency_s": round(self._avg_miss_latency, 4),
+            "gross_latency_saved_s": round(self.saved_seconds, 4),
+            "lookup_overhead_s": round(self.lookup_seconds, 4),
+            "latency_saved_s": round(self.saved_seconds - self.lookup_seconds, 4),
+        }
+
+    def save(self):
+        """Persists entries (in LRU order) and their embeddings to `self.path`."""
+        if not self._entries:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        rows = [self._keys.index(k) for k in self._entries]
+        meta = json.dumps({"model": self.model_name, "entries": list(self._entries.values())})
+        # Embeddings and entries go into one file, written under a per-process temp name and
+        # renamed over the old one: workers sharing `self.path` and shutting down at once can
+        # only replace each other's cache whole (last writer wins), never mix two of them
+        cache_path = os.path.join(self.path, CACHE_FILE)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, embeddings=self._matrix[rows], meta=np.array(meta))
+        os.replace(tmp_path, cache_path)
+
+    def load(self):
+        """
+        Restores a previously saved cache. Ignored if missing, built with another model, or if
+        its embeddings and entries do not line up one row per entry.
+        """
+        cache_path = os.path.join(self.path, CACHE_FILE)
+        if not os.path.exists(cache_path):
+            return
+        with np.load(cache_path, allow_pickle=False) as data:
+            matrix = data["embeddings"]
+            meta = json.loads(str(data["meta"]))
+        if meta.get("model") != self.model_name:
+            return
+        entries = meta["entries"]
+        if matrix.ndim != 2 or matrix.shape[0] != len(entries):
+            logger.warning(f"Ignoring semantic cache in {self.path}: {matrix.shape[0]} embeddings for {len(entries)} entries")
+            return
+        entries = entries[-self.max_entries:]
+        if entries:
+            self._matrix = matrix[-len(entries):]
+        for entry in entries:
+            self._entries[self._next_key] = entry
+            self._keys.append(self._next_key)
+            self._next_key += 1
+
+
+def _build_cache():
+    if not ENABLED:
+        return None
+    if np is None or TextEmbedding is None:
+        logger.warning("Semantic cache requested but numpy/fastembed are not installed; disabled.")
+        return None
+    cache = SemanticCache()
+    try:
+        cache.load()
+    except Exception as e:
+        logger.warning(f"Could not load semantic cache from {CACHE_PATH}: {e}")
+    return cache
+
+
+# Process-wide instance; None when the cache is disabled
+semantic_cache = _build_cache()
+
+
+async def cached_generate(generate, prompt: str, system_prompt: str) -> str:
+    """
+    Serves `prompt` from the semantic cache when possible, otherwise calls
+    `generate(prompt, system_prompt=...)` and stores the result.
+    """
+    # Until the embedding model has loaded at startup, turns bypass the cache
+    if semantic_cache is None or not semantic_cache.ready:
+        return await generate(prompt, system_prompt=system_prompt)
+    try:
+        with span("semantic_cache_lookup"):
+            cached, vec = await semantic_cache.lookup(prompt, system_prompt)
+    except Exception as e:
+        logger.error(f"Semantic cache lookup error: {e}")
+        return await generate(prompt, system_prompt=system_prompt)
+    if cached is not None:
+        return cached
+    start = time.perf_counter()
+    response = await generate(prompt, system_prompt=system_prompt)
+    semantic_cache.store(prompt, system_prompt, response, vec, time.perf_counter() - start)
+    return response
+
+
+def cache_stats() -> dict:
+    return semantic_cache.stats() if semantic_cache is not None else {"enabled": False}
@@ -0,0 +1,56 @@
+import os
+import argparse
+import uvicorn
+
+# Production launcher for the FastAPI backend.
+#
+# Runs `main:app` under uvicorn with one or more worker processes sharing the
+# listening socket. Every WebSocket connection is served start-to-finish by the
+# worker that accepted it, and the only per-connection in-memory state
+# (`main.session_context`) is a cache that is rebuilt from Supabase when a
+# connection is accepted. Workers therefore share no memory, and a reconnecting
+# session can land on any worker. On disk they share the semantic cache file
+# (SEMANTIC_CACHE_PATH): each worker loads it at startup and replaces it whole on
+# shutdown, so the last worker to stop wins.
+#
+# Counters and /metrics/* responses are per worker: a metrics request is answered
+# by whichever worker accepts it, identified by the `pid` field.
+#
+# Usage:
+#   python serve.py                      # one worker per CPU core (or WEB_CONCURRENCY)
+#   python serve.py --workers 4 --port 8000
+
+
+def default_workers() -> int:
+    """WEB_CONCURRENCY if set (the convention used by most PaaS hosts), else one worker per core."""
+    return int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the AI chat backend.")
+    parser.add_argument("--host", default=os.environ.get("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=default_workers())
+    parser.add_argument("--app", default="main:app", help="ASGI app to serve (bench_sessions.py uses bench_app:app)")
+    # Server-side keepalive: half-open connections are dropped after interval + timeout seconds
+    parser.add_argument("--ws-ping-interval", type=float, default=float(os.environ.get("WS_PING_INTERVAL", "20")))
+    parser.add_argument("--ws-ping-timeout", type=float, default=float(os.environ.get("WS_PING_TIMEOUT", "20")))
+    args = parser.parse_args()
+
+    # Workers read this to take their share of the per-node MAX_SESSIONS cap (see sessions.py)
+    os.environ["WEB_CONCURRENCY"] = str(args.workers)
+
+    uvicorn.run(
+        args.app,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        ws_ping_interval=args.ws_ping_interval,
+        ws_ping_timeout=args.ws_ping_timeout,
+        # Avoids uvicorn's own text access log bypassing the queued JSON logging pipeline
+        access_log=False,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+import os
+import time
+import asyncio
+from collections import Counter
+from database import end_sessions
+from observability import get_logger
+
+logger = get_logger("sessions")
+
+# Configuration (all optional, read from the environment)
+# Cap on concurrent sessions per node; each uvicorn worker enforces its share of it
+MAX_SESSIONS = int(os.environ.get("MAX_SESSIONS", "10000"))
+# Worker count on this node (serve.py exports it; 1 when running a single `uvicorn main:app`)
+WORKERS = max(1, int(os.environ.get("WEB_CONCURRENCY", "1")))
+# Seconds without a user message before a connected session is reaped
+IDLE_TIMEOUT = float(os.environ.get("SESSION_IDLE_TIMEOUT", "600"))
+REAPER_INTERVAL = float(os.environ.get("SESSION_REAPER_INTERVAL", "30"))
+
+
+class SessionEntry:
+    """
+    Bookkeeping for one live WebSocket connection on this worker. Several entries can share a
+    session_id (a client reconnecting while its old socket is still half-open), so per-connection
+    state is keyed by `entry.key`, not by session_id.
+    """
+
+    __slots__ = ("key", "session_id", "task", "last_activity", "busy", "reaped")
+
+    def __init__(self, session_id: str, task: asyncio.Task):
+        self.key = id(self)
+        self.session_id = session_id
+        self.task = task
+        self.last_activity = time.monotonic()
+        self.busy = False
+        self.reaped = False
+
+    def touch(self, busy: bool = False):
+        self.last_activity = time.monotonic()
+        self.busy = busy
+
+
+class SessionRegistry:
+    """
+    Tracks live connections on this worker, enforces this worker's share of the per-node
+    session cap (`max_sessions` / `workers`) and reaps idle connections.
+
+    Ended sessions are not written one by one: their ids are queued and the reaper writes all
+    `end_time`s with a single batched `sessions` update every `reaper_interval` seconds
+    (and once more on shutdown).
+    """
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS, idle_timeout: float = IDLE_TIMEOUT,
+                 reaper_interval: float = REAPER_INTERVAL, workers: int = WORKERS):
+        self.max_sessions = max_sessions
+        self.workers = workers
+        self.worker_limit = max(1, max_sessions // workers)
+        self.idle_timeout = idle_timeout
+        self.reaper_interval = reaper_interval
+        # entry.key -> SessionEntry, and live connection count per session_id
+        self._active: dict = {}
+        self._live = Counter()
+        self._pending_end: set = set()
+        self._task = None
+        self._baseline_rss = None
+        self.reaped_total = 0
+        self.rejected_total = 0
+
+    def has_capacity(self) -> bool:
+        if len(self._active) < self.worker_limit:
+            return True
+        self.rejected_total += 1
+        return False
+
+    def register(self, session_id: str) -> SessionEntry:
+        """
+        Registers the current task as a connection for `session_id` on this worker. Call it right
+        after `has_capacity()`, with no await in between, so the checked slot is the one taken.
+        """
+        entry = SessionEntry(session_id, asyncio.current_task())
+        self._active[entry.key] = entry
+        self._live[session_id] += 1
+        return entry
+
+    def release(self, entry: SessionEntry, end: bool = True) -> bool:
+        """
+        Forgets a finished connection. If `end` and no other connection for the same session is
+        live on this worker, queues its end_time for the next batch and returns True.
+
+        Connections on other workers are not visible here: a session that reconnected to another
+        worker can get an end_time from this one while still live. `upsert_session` clears it on
+        resume, and the live connection writes it again when it ends.
+        """
+        if self._active.pop(entry.key, None) is None:
+            return False
+        self._live[entry.session_id] -= 1
+        if self._live[entry.session_id] > 0:
+            return False
+        del self._live[entry.session_id]
+        if end:
+            self._pending_end.add(entry.session_id)
+        return end
+
+    def reap_idle(self) -> int:
+        """Cancels the handlers of sessions idle for longer than `idle_timeout`."""
+        cutoff = time.monotonic() - self.idle_timeout
+        idle = [e for e in self._active.values() if not e.busy and e.last_activity < cutoff]
+        for entry in idle:
+            entry.reaped = True
+            entry.task.cancel()
+        self.reaped_total += len(idle)
+        return len(idle)
+
+    async def flush_ended(self):
+        """Writes end_time for every queued session in one batched update."""
+        if not self._pending_end:
+            return
+        ids, self._pending_end = list(self._pending_end), set()
+        try:
+            await end_sessions(ids)
+        except Exception as e:
+            logger.error(f"Error ending {len(ids)} sessions: {e}")
+            self._pending_end.update(ids)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.reaper_interval)
+            reaped = self.reap_idle()
+            if reaped:
+                logger.info(f"Reaped {reaped} idle sessions")
+            await self.flush_ended()
+
+    def start(self):
+        self._baseline_rss = _current_rss()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush_ended()
+
+    def stats(self) -> dict:
+        active = len(self._active)
+        rss = _current_rss()
+        stats = {
+            "active_connections": active,
+            "active_sessions": len(self._live),
+            "max_sessions_per_node": self.max_sessions,
+            "max_sessions_per_worker": self.worker_limit,
+            "idle_timeout_s": self.idle_timeout,
+            "reaped_total": self.reaped_total,
+            "rejected_total": self.rejected_total,
+            "pending_end": len(self._pending_end),
+            "rss_bytes": rss,
+        }
+        if rss is not None and self._baseline_rss is not None:
+            # Growth over the startup footprint, attributed evenly to live connections
+            stats["baseline_rss_bytes"] = self._baseline_rss
+            stats["bytes_per_session"] = (rss - self._baseline_rss) // active if active else 0
+        return stats
+
+
+def _current_rss():
+    """Resident set size of this process in bytes (Linux only; None elsewhere)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+# Process-wide instance, started/stopped by the app lifespan
+session_registry = SessionRegistry()
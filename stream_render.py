@@ -0,0 +1,97 @@
+import time
+import queue
+
+# Sent by the backend as its own WebSocket frame after the last chunk of every answer
+# (ASCII "End of Transmission"; never produced by the model in normal text).
+END_OF_MESSAGE = "\u0004"
+
+
+class ThrottledRenderer:
+    """
+    Accumulates streamed chunks and re-renders the growing answer at most `fps` times per second.
+
+    Rendering the full text on every 4-character chunk makes render work quadratic in the
+    answer length; capping the frame rate keeps it proportional to the streaming time instead.
+    `render(text, done)` is called with the full text so far.
+    """
+
+    def __init__(self, render, fps: float = 15, clock=time.monotonic):
+        self.render = render
+        self.min_interval = 1.0 / fps
+        self.clock = clock
+        self.render_count = 0
+        self._parts = []
+        self._dirty = False
+        self._last_render = float("-inf")
+
+    @property
+    def text(self) -> str:
+        if len(self._parts) > 1:
+            self._parts = ["".join(self._parts)]
+        return self._parts[0] if self._parts else ""
+
+    def push(self, chunk: str):
+        self._parts.append(chunk)
+        self._dirty = True
+        self.flush_if_due()
+
+    def flush_if_due(self):
+        """Renders pending chunks if the frame interval has elapsed."""
+        now = self.clock()
+        if self._dirty and now - self._last_render >= self.min_interval:
+            self._draw(done=False)
+            self._last_render = now
+
+    def finish(self) -> str:
+        """Renders the final text (without the typing cursor) and returns it."""
+        self._draw(done=True)
+        return self.text
+
+    def _draw(self, done: bool):
+        self.render(self.text, done)
+        self.render_count += 1
+        self._dirty = False
+
+
+def drain(msg_queue) -> int:
+    """
+    Discards frames still queued from an earlier answer (e.g. the tail and END_OF_MESSAGE of one
+    that timed out), so they are not shown as the start of the next answer. Returns how many were dropped.
+    """
+    dropped = 0
+    while True:
+        try:
+            msg_queue.get_nowait()
+        except queue.Empty:
+            return dropped
+        dropped += 1
+
+
+def consume_stream(msg_queue, renderer: ThrottledRenderer, first_token_timeout: float = 15.0, gap_timeout: float = 5.0):
+    """
+    Feeds frames from `msg_queue` into `renderer` until the backend's END_OF_MESSAGE frame.
+
+    Returns `(text, status)` where status is "complete", or "timeout" if no first chunk arrived
+    within `first_token_timeout` or the stream went silent for `gap_timeout` seconds (a fallback
+    for backends that do not send END_OF_MESSAGE).
+    """
+    start = last = time.monotonic()
+    got_data = False
+    while True:
+        try:
+            frame = msg_queue.get(timeout=renderer.min_interval)
+        except queue.Empty:
+            # Show chunks that arrived just before a pause, even if no new frame triggers a render
+            renderer.flush_if_due()
+            now = time.monotonic()
+            if not got_data and now - start > first_token_timeout:
+                return renderer.text, "timeout"
+            if got_data and now - last > gap_timeout:
+                return renderer.finish(), "timeout"
+            continue
+
+        if frame == END_OF_MESSAGE:
+            return renderer.finish(), "complete"
+        got_data = True
+        last = time.monotonic()
+        renderer.push(frame)
@@ -6,11 +6,13 @@ import queue
 import time
 import os
 import requests
-from streamlit_autorefresh import st_autorefresh
+from stream_render import ThrottledRenderer, consume_stream, drain
 
 # ---------------- CONFIG ----------------
 BACKEND_WS_URL = os.getenv("BACKEND_WS_URL", "wss://ai-chat-backend-production-f884.up.railway.app/ws/session/{session_id}")
 BACKEND_HTTP_URL = os.getenv("BACKEND_HTTP_URL", "https://ai-chat-backend-production-f884.up.railway.app")
+# Max re-renders per second while an answer is streaming
+STREAM_FPS = float(os.getenv("STREAM_FPS", "15"))
 
 # ---------------- STATE ----------------
 if "session_id" not in st.session_state: st.session_state.session_id = None
@@ -43,6 +45,19 @@ def start_ws(url, msg_queue):
     t.start()
     return ws
 
+# ---------------- RENDERING ----------------
+def message_html(role, content):
+    """
+    Builds a chat bubble's markup once when the message is added. Streamlit still re-emits every
+    history bubble on each rerun; the client keeps reruns rare instead (only on new data).
+    """
+    marker_class = "chat-user-marker" if role == "user" else "chat-ai-marker"
+    # Merge marker and content to prevent extra widget spacing
+    return f'<div class="{marker_class}" style="display:none;"></div>{content}'
+
+def add_message(role, content):
+    st.session_state.messages.append({"role": role, "content": content, "html": message_html(role, content)})
+
 # ---------------- UI SETUP ----------------
 st.set_page_config(page_title="Realtime AI Assistant", page_icon="✨", layout="wide")
 
@@ -416,10 +431,7 @@ for m in st.session_state.messages:
     # Icons: 🧠 for AI, 👤 for User
     avatar_char = "👤" if m["role"] == "user" else "🧠"
     with st.chat_message(m["role"], avatar=avatar_char):
-        marker_class = "chat-user-marker" if m["role"] == "user" else "chat-ai-marker"
-        # Merge marker and content to prevent extra widget spacing
-        full_content = f'<div class="{marker_class}" style="display:none;"></div>{m["content"]}'
-        st.markdown(full_content, unsafe_allow_html=True)
+        st.markdown(m["html"], unsafe_allow_html=True)
 
 # Summary Display (Elegant Card)
 if st.session_state.summary:
@@ -430,10 +442,17 @@ if st.session_state.summary:
 # Input Area
 if st.session_state.connected:
     if prompt := st.chat_input("Type your message here..."):
-        st.session_state.messages.append({"role": "user", "content": prompt})
+        add_message("user", prompt)
         if st.session_state.ws:
-            st.session_state.ws.send(prompt)
-            st.session_state.waiting = True
+            # Late frames from a previous, timed-out answer must not leak into this one
+            drain(st.session_state.ws_queue)
+            try:
+                st.session_state.ws.send(prompt)
+                st.session_state.waiting = True
+            except websocket.WebSocketConnectionClosedException:
+                # The backend closes sessions that stay idle too long; start a new one
+                st.session_state.connected = False
+                st.session_state.ws = None
         st.rerun()
 
 # ---------------- STREAMING LOOP ----------------
@@ -455,34 +474,15 @@ if st.session_state.waiting:
             </style>
         """, unsafe_allow_html=True)
         
-        full = ""
-        last = time.time()
-        start_wait = time.time()
-        
-        while True:
-            try:
-                token = st.session_state.ws_queue.get(timeout=0.1)
-                full += token
-                # Render marker + text in one go
-                placeholder.markdown(marker_html + full + "▌", unsafe_allow_html=True)
-                last = time.time()
-            except queue.Empty:
-                now = time.time()
-                # 15s Timeout for first token
-                if not full:
-                    if now - start_wait > 15:
-                        placeholder.error("AI response timed out.")
-                        break
-                # 2s Timeout for gaps
-                elif now - last > 2:
-                    break
-
-        # Final render
-        placeholder.markdown(marker_html + full, unsafe_allow_html=True)
-        st.session_state.messages.append({"role": "assistant", "content": full})
+        def render(text, done):
+            # Render marker + text in one go
+            placeholder.markdown(marker_html + text + ("" if done else "▌"), unsafe_allow_html=True)
+
+        # Reads until the backend's end-of-message frame, re-rendering at most STREAM_FPS times per second
+        full, status = consume_stream(st.session_state.ws_queue, ThrottledRenderer(render, fps=STREAM_FPS))
+        if status == "timeout" and not full:
+            placeholder.error("AI response timed out.")
+
+        add_message("assistant", full)
         st.session_state.waiting = False
         st.rerun()
-
-# ---------------- HEARTBEAT ----------------
-if st.session_state.connected:
-    st_autorefresh(interval=1000, key="heartbeat")
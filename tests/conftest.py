@@ -0,0 +1,7 @@
+import os
+
+# `database` connects at import time; force dummy credentials (as bench_app.py does) so the
+# tests can import it without a .env and never reach a real Supabase project.
+os.environ["SUPABASE_URL"] = "http://127.0.0.1:9"
+os.environ["SUPABASE_KEY"] = "test.test.test"
+os.environ["SEMANTIC_CACHE_ENABLED"] = "false"
@@ -0,0 +1,124 @@
+import asyncio
+import json
+import os
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from semantic_cache import CACHE_FILE, SemanticCache
+
+GENERAL = "You are a helpful AI assistant."
+CODER = "You are an expert Python programmer."
+
+
+def unit(i: int, dim: int = 8):
+    vec = np.zeros(dim, dtype=np.float32)
+    vec[i % dim] = 1.0
+    return vec
+
+
+def fill(cache: SemanticCache, n: int, system_prompt: str = GENERAL):
+    for i in range(n):
+        cache.store(f"q{i}", system_prompt, f"a{i}", unit(i), latency=1.0)
+
+
+def assert_aligned(cache: SemanticCache):
+    """Every entry's embedding row is the one it was stored with."""
+    assert cache._matrix.shape[0] == len(cache._keys) == len(cache._entries)
+    for row, key in enumerate(cache._keys):
+        i = int(cache._entries[key]["prompt"][1:])
+        assert np.array_equal(cache._matrix[row], unit(i))
+
+
+def test_lru_eviction_keeps_matrix_and_keys_aligned(tmp_path):
+    cache = SemanticCache(max_entries=3, path=str(tmp_path))
+    fill(cache, 3)
+    # Touch q0 so q1 becomes the least recently used entry
+    cache._entries.move_to_end(cache._keys[0])
+    cache.store("q3", GENERAL, "a3", unit(3), latency=1.0)
+
+    assert [e["prompt"] for e in cache._entries.values()] == ["q2", "q0", "q3"]
+    assert_aligned(cache)
+
+
+def test_search_respects_threshold_and_persona(tmp_path):
+    cache = SemanticCache(threshold=0.9, path=str(tmp_path))
+    cache.store("q0", CODER, "code answer", unit(0), latency=1.0)
+    cache.store("q0", GENERAL, "general answer", unit(0), latency=1.0)
+
+    key = cache._search(unit(0), GENERAL)
+    assert cache._entries[key]["response"] == "general answer"
+    assert cache._search(unit(0), "You are a creative writer.") is None
+
+    # cos = 0.8, below the threshold
+    close = np.array([0.8, 0.6] + [0.0] * 6, dtype=np.float32)
+    assert cache._search(close, GENERAL) is None
+    cache.threshold = 0.75
+    assert cache._search(close, GENERAL) is not None
+
+
+def test_lookup_counts_hits_and_misses(tmp_path):
+    cache = SemanticCache(path=str(tmp_path))
+    cache._embed = lambda text: unit(int(text[1:]))
+    fill(cache, 2)
+
+    assert asyncio.run(cache.lookup("q1", GENERAL))[0] == "a1"
+    response, vec = asyncio.run(cache.lookup("q5", GENERAL))
+    assert response is None and np.array_equal(vec, unit(5))
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_error_responses_are_not_stored(tmp_path):
+    cache = SemanticCache(path=str(tmp_path))
+    cache.store("q0", GENERAL, "Error generating response: timeout", unit(0), latency=1.0)
+    assert not cache._entries
+
+
+def test_save_load_round_trip_preserves_lru_order_and_rows(tmp_path):
+    cache = SemanticCache(max_entries=4, path=str(tmp_path))
+    fill(cache, 4)
+    cache._entries.move_to_end(cache._keys[1])
+    cache.save()
+    assert os.listdir(tmp_path) == [CACHE_FILE]
+
+    restored = SemanticCache(max_entries=4, path=str(tmp_path))
+    restored.load()
+    assert [e["prompt"] for e in restored._entries.values()] == ["q0", "q2", "q3", "q1"]
+    assert_aligned(restored)
+
+    # Evicting after a reload still drops the least recently used entry and its row
+    restored.store("q4", GENERAL, "a4", unit(4), latency=1.0)
+    assert [e["prompt"] for e in restored._entries.values()] == ["q2", "q3", "q1", "q4"]
+    assert_aligned(restored)
+
+
+def test_load_keeps_most_recent_entries_when_max_shrinks(tmp_path):
+    cache = SemanticCache(max_entries=5, path=str(tmp_path))
+    fill(cache, 5)
+    cache.save()
+
+    restored = SemanticCache(max_entries=2, path=str(tmp_path))
+    restored.load()
+    assert [e["prompt"] for e in restored._entries.values()] == ["q3", "q4"]
+    assert_aligned(restored)
+
+
+def test_load_rejects_misaligned_file(tmp_path):
+    entries = [{"system_prompt": GENERAL, "prompt": f"q{i}", "response": f"a{i}"} for i in range(3)]
+    meta = json.dumps({"model": SemanticCache().model_name, "entries": entries})
+    np.savez(tmp_path / CACHE_FILE, embeddings=np.stack([unit(0), unit(1)]), meta=np.array(meta))
+
+    cache = SemanticCache(path=str(tmp_path))
+    cache.load()
+    assert not cache._entries and not cache._keys
+
+
+def test_load_ignores_other_model_and_missing_file(tmp_path):
+    cache = SemanticCache(model_name="model-a", path=str(tmp_path))
+    cache.load()
+    fill(cache, 2)
+    cache.save()
+
+    other = SemanticCache(model_name="model-b", path=str(tmp_path))
+    other.load()
+    assert not other._entries
@@ -0,0 +1,123 @@
+import asyncio
+import time
+
+import sessions
+from sessions import SessionRegistry
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_worker_limit_is_share_of_node_cap():
+    assert SessionRegistry(max_sessions=100, workers=4).worker_limit == 25
+    assert SessionRegistry(max_sessions=3, workers=8).worker_limit == 1
+
+
+def test_capacity_counts_connections_and_rejections():
+    async def scenario():
+        registry = SessionRegistry(max_sessions=2, workers=1)
+        assert registry.has_capacity()
+        a = registry.register("s1")
+        assert registry.has_capacity()
+        registry.register("s1")
+        assert not registry.has_capacity()
+        registry.release(a)
+        assert registry.has_capacity()
+        return registry
+
+    registry = run(scenario())
+    assert registry.rejected_total == 1
+    assert registry.stats()["active_connections"] == 1
+
+
+def test_session_ends_only_with_its_last_connection():
+    async def scenario():
+        registry = SessionRegistry()
+        old = registry.register("s1")
+        new = registry.register("s1")
+        assert registry.stats()["active_sessions"] == 1
+        # The half-open old socket goes away first: the session is still live
+        assert registry.release(old) is False
+        assert registry._pending_end == set()
+        assert registry.release(new) is True
+        assert registry._pending_end == {"s1"}
+        # Releasing twice is a no-op
+        assert registry.release(new) is False
+
+    run(scenario())
+
+
+def test_release_without_end_does_not_queue():
+    async def scenario():
+        registry = SessionRegistry()
+        entry = registry.register("s1")
+        assert registry.release(entry, end=False) is False
+        assert registry._pending_end == set()
+        assert registry.stats()["active_sessions"] == 0
+
+    run(scenario())
+
+
+def test_reap_idle_cancels_only_idle_and_not_busy_connections():
+    async def scenario():
+        registry = SessionRegistry(idle_timeout=10)
+
+        async def handler(session_id, idle, busy=False):
+            entry = registry.register(session_id)
+            if idle:
+                entry.touch(busy=busy)
+                entry.last_activity = time.monotonic() - 60
+            try:
+                await asyncio.sleep(3600)
+            except asyncio.CancelledError:
+                return entry.reaped
+            finally:
+                registry.release(entry)
+
+        tasks = [
+            asyncio.create_task(handler("idle", idle=True)),
+            asyncio.create_task(handler("busy", idle=True, busy=True)),
+            asyncio.create_task(handler("active", idle=False)),
+        ]
+        await asyncio.sleep(0)
+        assert registry.reap_idle() == 1
+        assert await tasks[0] is True
+        assert not tasks[1].done() and not tasks[2].done()
+        for task in tasks[1:]:
+            task.cancel()
+        await asyncio.gather(*tasks[1:], return_exceptions=True)
+        return registry
+
+    registry = run(scenario())
+    assert registry.reaped_total == 1
+    assert registry._pending_end == {"idle", "busy", "active"}
+
+
+def test_flush_ended_batches_and_retries_on_failure(monkeypatch):
+    calls = []
+
+    async def failing(ids):
+        calls.append(sorted(ids))
+        raise RuntimeError("supabase down")
+
+    async def ok(ids):
+        calls.append(sorted(ids))
+
+    async def scenario():
+        registry = SessionRegistry()
+        for session_id in ("s1", "s2"):
+            registry.release(registry.register(session_id))
+
+        monkeypatch.setattr(sessions, "end_sessions", failing)
+        await registry.flush_ended()
+        assert registry._pending_end == {"s1", "s2"}
+
+        monkeypatch.setattr(sessions, "end_sessions", ok)
+        await registry.flush_ended()
+        assert registry._pending_end == set()
+        # Nothing queued: no update is sent
+        await registry.flush_ended()
+
+    run(scenario())
+    assert calls == [["s1", "s2"], ["s1", "s2"]]
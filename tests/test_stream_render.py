@@ -0,0 +1,71 @@
+import queue
+
+from stream_render import END_OF_MESSAGE, ThrottledRenderer, consume_stream, drain
+
+
+def make_renderer(fps: float = 10, clock=None):
+    frames = []
+    renderer = ThrottledRenderer(lambda text, done: frames.append((text, done)), fps=fps, clock=clock or (lambda: 0.0))
+    return renderer, frames
+
+
+def test_renderer_caps_frame_rate():
+    now = {"t": 0.0}
+    renderer, frames = make_renderer(fps=10, clock=lambda: now["t"])
+    # 100 chunks over one second of simulated time
+    for i in range(100):
+        now["t"] = i * 0.01
+        renderer.push("ab")
+    assert renderer.finish() == "ab" * 100
+    assert len(frames) == 11  # 10 throttled frames plus the final one
+    assert frames[-1] == ("ab" * 100, True)
+    assert all(not done for _, done in frames[:-1])
+
+
+def test_flush_if_due_renders_pending_chunks_after_a_pause():
+    now = {"t": 0.0}
+    renderer, frames = make_renderer(fps=10, clock=lambda: now["t"])
+    renderer.push("a")
+    renderer.push("b")
+    assert frames == [("a", False)]
+    now["t"] = 0.5
+    renderer.flush_if_due()
+    assert frames[-1] == ("ab", False)
+    # Nothing new: no extra render
+    now["t"] = 1.0
+    renderer.flush_if_due()
+    assert len(frames) == 2
+
+
+def test_consume_stream_stops_at_end_of_message():
+    msg_queue = queue.Queue()
+    for frame in ("Hel", "lo", END_OF_MESSAGE, "next"):
+        msg_queue.put(frame)
+    renderer, frames = make_renderer(fps=1000)
+    assert consume_stream(msg_queue, renderer) == ("Hello", "complete")
+    assert frames[-1] == ("Hello", True)
+    # Frames after END_OF_MESSAGE belong to the next answer
+    assert msg_queue.get_nowait() == "next"
+
+
+def test_consume_stream_times_out_without_first_token():
+    renderer, frames = make_renderer(fps=100)
+    assert consume_stream(queue.Queue(), renderer, first_token_timeout=0.05) == ("", "timeout")
+    assert frames == []
+
+
+def test_consume_stream_times_out_on_silent_gap():
+    msg_queue = queue.Queue()
+    msg_queue.put("partial")
+    renderer, frames = make_renderer(fps=100)
+    assert consume_stream(msg_queue, renderer, gap_timeout=0.05) == ("partial", "timeout")
+    assert frames[-1] == ("partial", True)
+
+
+def test_drain_discards_stale_frames():
+    msg_queue = queue.Queue()
+    for frame in ("tail", END_OF_MESSAGE):
+        msg_queue.put(frame)
+    assert drain(msg_queue) == 2
+    assert msg_queue.empty()
+    assert drain(msg_queue) == 0